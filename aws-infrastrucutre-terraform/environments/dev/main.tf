@@ -61,5 +61,7 @@ module "ec2" {
   public_filename  = var.public_filename
   key_name         = var.key_name
 
+  echo_jenkins_password = var.echo_jenkins_password
+
   tags = local.common_tags
 }
@@ -118,3 +118,8 @@ variable "ssh_user" {
 
 variable "git_username" { type = string }
 variable "git_pat" { type = string }
+
+variable "echo_jenkins_password" {
+  type    = bool
+  default = false
+}
@@ -185,7 +185,10 @@ resource "null_resource" "bootstrap" {
       "chmod +x devops-infra/scripts/devops-setup.sh",
 
       "echo '--- RUNNING DEVOPS SETUP ---'",
-      "sudo -E devops-infra/scripts/devops-setup.sh dev true false false"
+      "sudo -E devops-infra/scripts/devops-setup.sh dev true false false",
+
+      # Hand the Jenkins unlock password (or a no-password marker) back over this session so the driver needn't SSH again
+      var.echo_jenkins_password ? "if sudo test -f /var/lib/jenkins/secrets/initialAdminPassword; then sudo cat /var/lib/jenkins/secrets/initialAdminPassword | sed 's/^/__JENKINS_PW__:/'; else echo __JENKINS_PW__:__NO_PASSWORD__; fi" : "true"
     ]
   }
 }
\ No newline at end of file
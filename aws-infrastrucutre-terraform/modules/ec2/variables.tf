@@ -60,4 +60,13 @@ variable "root_device_name" {
   type        = string
   description = "Root device name for block mapping"
   default     = "/dev/xvda"
+}
+
+############################
+# Bootstrap output
+############################
+variable "echo_jenkins_password" {
+  type        = bool
+  description = "Print the Jenkins initial admin password, or __NO_PASSWORD__ if the wizard is disabled (prefixed __JENKINS_PW__:), at the end of bootstrap"
+  default     = false
 }
\ No newline at end of file
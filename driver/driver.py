@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import functools
 import os
 import re
 import shutil
-import subprocess
-import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 # -----------------------------
 # USER CONFIG: Local Key Paths
@@ -46,6 +49,9 @@ ENV_FILE_NAME = ".env"
 SETUP_SH = "setup.sh"
 DESTROY_SH = "destroy.sh"
 
+# Never searched for setup.sh / destroy.sh (matched case-insensitively)
+_SKIP_DIRS = {".git", ".terraform", "node_modules"}
+
 # We want Terraform to pick up vars from environments/dev
 ENV_DEV_REL = Path("environments") / "dev"
 DEV_CREDENTIALS = ENV_DEV_REL / "credentials.auto.tfvars"
@@ -65,14 +71,17 @@ class RepoPaths:
 # ---------------------------------------------------------------------
 # UI helpers
 # ---------------------------------------------------------------------
+_SEP = "-" * 70
+
+
 def _print_header() -> None:
     print("\nCloudRift Terraform Driver (Windows)")
-    print("-" * 70)
+    print(_SEP)
     print(f"DEVOPS repo URL:   {devops_repo_url or '<not loaded yet>'}")
     print(f"BACKEND repo URL:  {backend_repo_url or '<not loaded yet>'}")
     print(f"FRONTEND repo URL: {frontend_repo_url or '<not loaded yet>'}")
     print(f"EC2 DNS Name:      {ec2_dns or '<not set>'}")
-    print("-" * 70)
+    print(_SEP)
 
 
 def _prompt_yes_no(prompt: str, default_yes: bool = True) -> bool:
@@ -88,75 +97,59 @@ def _prompt_yes_no(prompt: str, default_yes: bool = True) -> bool:
         print("Please enter y/yes or n/no.")
 
 
+_STARS = "*" * 128
+
+
+def _mask(s: str) -> str:
+    """Hide all but the last 4 characters of a secret."""
+    if not s: return "<empty>"
+    return _STARS[:max(0, len(s) - 4)] + s[-4:]
+
+
 def _mask_access_key(k: str) -> str:
-    if not k: return "<empty>"
-    return ("*" * max(0, len(k) - 4)) + k[-4:]
+    return _mask(k)
 
 
 def _mask_pat(p: str) -> str:
-    if not p: return "<empty>"
-    return ("*" * max(0, len(p) - 4)) + p[-4:]
+    return _mask(p)
 
 
 # ---------------------------------------------------------------------
 # Robust .env parsing
 # ---------------------------------------------------------------------
-def _strip_inline_comment_preserving_quotes(s: str) -> str:
-    in_single = False
-    in_double = False
-    out: list[str] = []
-    for ch in s:
-        if ch == "'" and not in_double:
-            in_single = not in_single
-            out.append(ch)
-            continue
-        if ch == '"' and not in_single:
-            in_double = not in_double
-            out.append(ch)
-            continue
-        if ch == "#" and not in_single and not in_double:
-            break
-        out.append(ch)
-    return "".join(out).strip()
+# One assignment per line: [export] KEY = VALUE or KEY: str = VALUE [# comment].
+# The value runs up to the first '#' outside a '...' / "..." pair; an unterminated
+# quote keeps the rest of the line.
+_ENV_LINE_RE = re.compile(
+    r"""^[ \t]*(?:(?i:export)[ \t]+)?([A-Za-z_][A-Za-z0-9_]*)(?:[ \t]*:[ \t]*str)?[ \t]*=[ \t]*"""
+    r"""((?:[^'"#\n]|'[^'\n]*'|"[^"\n]*")*(?:['"][^\n]*)?)(?:#[^\n]*)?$""",
+    re.MULTILINE,
+)
 
 
 def _unquote(s: str) -> str:
     s = s.strip()
-    if len(s) >= 2 and ((s[0] == s[-1] == '"') or (s[0] == s[-1] == "'")):
-        return s[1:-1]
-    return s
+    if len(s) < 2: return s
+    first, last = s[0], s[-1]
+    return s[1:-1] if first == last and first in "\"'" else s
 
 
 def _load_env_file(env_path: Path) -> dict[str, str]:
-    if not env_path.exists():
-        raise FileNotFoundError(f"Missing {ENV_FILE_NAME} next to driver.py: {env_path}")
+    try:
+        st = env_path.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Missing {ENV_FILE_NAME} next to driver.py: {env_path}") from None
+    # Copy so callers can't mutate the cached parse result
+    return dict(_parse_env_file(str(env_path), st.st_mtime_ns, st.st_size))
 
-    data: dict[str, str] = {}
-    lines = env_path.read_text(encoding="utf-8", errors="replace").splitlines()
-    py_like = re.compile(r"""^\s*([A-Za-z_][A-Za-z0-9_]*)\s*:\s*str\s*=\s*(.+?)\s*$""")
-
-    for raw in lines:
-        line = raw.strip()
-        if not line or line.startswith("#"): continue
-        if line.lower().startswith("export "): line = line[7:].strip()
-
-        key: str | None = None
-        val: str | None = None
-
-        m = py_like.match(line)
-        if m:
-            key = m.group(1).strip()
-            val = m.group(2).strip()
-        elif "=" in line:
-            k, v = line.split("=", 1)
-            key = k.strip()
-            val = v.strip()
-        else:
-            continue
 
-        val = _strip_inline_comment_preserving_quotes(val)
-        val = _unquote(val)
-        data[key] = val
+@functools.lru_cache(maxsize=8)
+def _parse_env_file(path_str: str, mtime_ns: int, size: int) -> dict[str, str]:
+    # mtime_ns/size are only part of the cache key: an edited .env misses the cache
+    data: dict[str, str] = {}
+    text = Path(path_str).read_text(encoding="utf-8", errors="replace")
+    for m in _ENV_LINE_RE.finditer(text):
+        data[m.group(1)] = _unquote(m.group(2))
     return data
 
 
@@ -166,59 +159,75 @@ def _apply_env(data: dict[str, str]) -> None:
     global devops_repo_url, backend_repo_url, frontend_repo_url
     global git_username, git_pat
     global smee_backend, smee_frontend, smee_devops, smee_url, smee_target
+    global _aws_identity_cache, _ec2_client_cache, _credentials_tfvars_blob
+
+    # Upper-cased keys -> stripped non-empty values; an exact UPPER_CASE key beats other spellings
+    norm: dict[str, str] = {}
+    for k, v in data.items():
+        v = v.strip()
+        if not v: continue
+        ku = k.upper()
+        if ku not in norm or k == ku: norm[ku] = v
 
     def pick(*names: str) -> str:
-        for n in names:
-            if n in data and str(data[n]).strip(): return str(data[n]).strip()
-        return ""
-
-    aws_region = pick("AWS_REGION", "aws_region")
-    aws_access_token = pick("AWS_ACCESS_TOKEN", "aws_access_token", "AWS_ACCESS", "aws_access")
-    aws_secret_token = pick("AWS_SECRET_TOKEN", "aws_secret_token", "AWS_SECRET", "aws_secret")
-    aws_session_token = pick("AWS_SESSION_TOKEN", "aws_session_token")
-    account_id = pick("ACCOUNT_ID", "account_id")
-    owner = pick("OWNER", "owner")
-    ec2_dns = pick("ec2_dns")
-
-    devops_repo_url = pick("DEVOPS_REPO_URL", "devops_repo_url")
-    backend_repo_url = pick("BACKEND_REPO_URL", "backend_repo_url", "API_REPO_URL", "api_repo_url")
-    frontend_repo_url = pick("FRONTEND_REPO_URL", "frontend_repo_url")
-
-    git_username = pick("GITHUB_USER", "GIT_USERNAME", "git_username")
-    git_pat = pick("GITHUB_PAT", "GIT_PAT", "git_pat")
-    smee_url = pick("SMEE_URL", "smee_url")
-    smee_target = pick("SMEE_TARGET", "smee_target")
-    smee_backend = pick("SMEE_BACKEND", "smee_backend")
-    smee_frontend = pick("SMEE_FRONTEND", "smee_frontend")
-    smee_devops = pick("SMEE_DEVOPS", "smee_devops")
-
-    missing = []
-    if not aws_region: missing.append("AWS_REGION")
-    if not aws_access_token: missing.append("AWS_ACCESS_TOKEN")
-    if not aws_secret_token: missing.append("AWS_SECRET_TOKEN")
-    if not account_id: missing.append("ACCOUNT_ID")
-    if not owner: missing.append("OWNER")
-    if not devops_repo_url: missing.append("DEVOPS_REPO_URL")
-    if not backend_repo_url: missing.append("BACKEND_REPO_URL")
-    if not frontend_repo_url: missing.append("FRONTEND_REPO_URL")
+        return next((norm[n] for n in names if n in norm), "")
+
+    aws_region = pick("AWS_REGION")
+    aws_access_token = pick("AWS_ACCESS_TOKEN", "AWS_ACCESS")
+    aws_secret_token = pick("AWS_SECRET_TOKEN", "AWS_SECRET")
+    aws_session_token = pick("AWS_SESSION_TOKEN")
+    account_id = pick("ACCOUNT_ID")
+    owner = pick("OWNER")
+    ec2_dns = pick("EC2_DNS")
+
+    devops_repo_url = pick("DEVOPS_REPO_URL")
+    backend_repo_url = pick("BACKEND_REPO_URL", "API_REPO_URL")
+    frontend_repo_url = pick("FRONTEND_REPO_URL")
+
+    git_username = pick("GITHUB_USER", "GIT_USERNAME")
+    git_pat = pick("GITHUB_PAT", "GIT_PAT")
+    smee_url = pick("SMEE_URL")
+    smee_target = pick("SMEE_TARGET")
+    smee_backend = pick("SMEE_BACKEND")
+    smee_frontend = pick("SMEE_FRONTEND")
+    smee_devops = pick("SMEE_DEVOPS")
+    _invalidate_subprocess_env()
+    _aws_identity_cache = None
+    _ec2_client_cache = None
+    _credentials_tfvars_blob = None
+
+    required = (
+        ("AWS_REGION", aws_region),
+        ("AWS_ACCESS_TOKEN", aws_access_token),
+        ("AWS_SECRET_TOKEN", aws_secret_token),
+        ("ACCOUNT_ID", account_id),
+        ("OWNER", owner),
+        ("DEVOPS_REPO_URL", devops_repo_url),
+        ("BACKEND_REPO_URL", backend_repo_url),
+        ("FRONTEND_REPO_URL", frontend_repo_url),
+    )
+    missing = [name for name, value in required if not value]
 
     if missing:
         raise ValueError(f"{ENV_FILE_NAME} is missing required keys: {', '.join(missing)}")
 
+    _credentials_tfvars_blob = _credentials_tfvars_content().encode("utf-8")
+
 
 def _print_loaded_env(env_path: Path) -> None:
     print("\nLoaded configuration from .env")
-    print("-" * 70)
+    print(_SEP)
     print(f"AWS_REGION:        {aws_region}")
     print(f"ACCOUNT_ID:        {account_id}")
     print(f"OWNER:             {owner}")
     print(f"EC2_DNS:           {ec2_dns or '<not set - will use AWS default>'}")
-    print("-" * 70)
+    print(_SEP)
 
 
 # ---------------------------------------------------------------------
 # Dynamic repo/infra detection
 # ---------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
 def _find_devops_repo_root_from_script_location(script_dir: Path) -> Path:
     cur = script_dir.resolve()
     for _ in range(20):
@@ -228,9 +237,7 @@ def _find_devops_repo_root_from_script_location(script_dir: Path) -> Path:
     raise RuntimeError("Could not locate DevOps repo root (.git).")
 
 
-def _path_distance(a: Path, b: Path) -> int:
-    a_parts = a.parts
-    b_parts = b.parts
+def _path_distance(a_parts: tuple[str, ...], b_parts: tuple[str, ...]) -> int:
     common = 0
     for ap, bp in zip(a_parts, b_parts):
         if ap == bp:
@@ -240,32 +247,40 @@ def _path_distance(a: Path, b: Path) -> int:
     return (len(a_parts) - common) + (len(b_parts) - common)
 
 
-def _find_infra_dir(devops_repo_root: Path) -> tuple[Path, Path, Path]:
-    setup_candidates = list(devops_repo_root.rglob(SETUP_SH))
-    destroy_candidates = list(devops_repo_root.rglob(DESTROY_SH))
-
-    def valid(p: Path) -> bool:
-        parts = {x.lower() for x in p.parts}
-        return ".git" not in parts and ".terraform" not in parts and "node_modules" not in parts
+def _scan_for_scripts(root: Path) -> tuple[dict[Path, Path], dict[Path, Path]]:
+    """
+    Find setup.sh / destroy.sh in one walk, never descending into skipped dirs.
+    Returns ({dir: setup.sh}, {dir: destroy.sh}). Only root is resolved: os.walk
+    doesn't follow directory symlinks, so every dirpath below it is already canonical.
+    """
+    setup_dirs: dict[Path, Path] = {}
+    destroy_dirs: dict[Path, Path] = {}
+    for dirpath, dirnames, filenames in os.walk(root.resolve()):
+        dirnames[:] = [d for d in dirnames if d.lower() not in _SKIP_DIRS]
+        has_setup = SETUP_SH in filenames
+        has_destroy = DESTROY_SH in filenames
+        if not (has_setup or has_destroy): continue
+        d = Path(dirpath)
+        if has_setup: setup_dirs[d] = d / SETUP_SH
+        if has_destroy: destroy_dirs[d] = d / DESTROY_SH
+    return setup_dirs, destroy_dirs
 
-    setup_candidates = [p for p in setup_candidates if valid(p)]
-    destroy_candidates = [p for p in destroy_candidates if valid(p)]
 
-    if not setup_candidates: raise FileNotFoundError(f"Could not find {SETUP_SH}")
-    if not destroy_candidates: raise FileNotFoundError(f"Could not find {DESTROY_SH}")
+def _find_infra_dir(devops_repo_root: Path) -> tuple[Path, Path, Path]:
+    setup_dirs, destroy_dirs = _scan_for_scripts(devops_repo_root)
 
-    setup_dirs = {p.parent.resolve(): p.resolve() for p in setup_candidates}
-    destroy_dirs = {p.parent.resolve(): p.resolve() for p in destroy_candidates}
-    common = set(setup_dirs.keys()) & set(destroy_dirs.keys())
+    if not setup_dirs: raise FileNotFoundError(f"Could not find {SETUP_SH}")
+    if not destroy_dirs: raise FileNotFoundError(f"Could not find {DESTROY_SH}")
 
+    common = setup_dirs.keys() & destroy_dirs.keys()
     if common:
-        infra = sorted(common, key=lambda x: len(str(x)))[0]
+        infra = min(common, key=lambda x: len(str(x)))
         return infra, setup_dirs[infra], destroy_dirs[infra]
 
-    setup_sh = sorted(setup_candidates, key=lambda x: len(str(x)))[0].resolve()
-    infra = setup_sh.parent.resolve()
-    destroy_sh = min(destroy_candidates, key=lambda x: _path_distance(infra, x.parent.resolve())).resolve()
-    return infra, setup_sh, destroy_sh
+    infra = min(setup_dirs, key=lambda x: len(str(x)))
+    infra_parts = infra.parts
+    destroy_dir = min(destroy_dirs, key=lambda x: _path_distance(infra_parts, x.parts))
+    return infra, setup_dirs[infra], destroy_dirs[destroy_dir]
 
 
 def _build_repo_paths(devops_repo_root: Path) -> RepoPaths:
@@ -282,36 +297,41 @@ def _build_repo_paths(devops_repo_root: Path) -> RepoPaths:
 
 def _print_detected_paths(p: RepoPaths) -> None:
     print("\nDetected paths")
-    print("-" * 70)
+    print(_SEP)
     print(f"Infra directory:          {p.infra_dir}")
     print(f"setup.sh:                 {p.setup_sh}")
-    print("-" * 70)
+    print(_SEP)
 
 
 # ---------------------------------------------------------------------
 # tfvars writing
 # ---------------------------------------------------------------------
+# Encoded credentials.auto.tfvars for the loaded config; rendered by _apply_env
+_credentials_tfvars_blob: bytes | None = None
+
+
 def _credentials_tfvars_content() -> str:
-    lines = [
-        f'aws_access_key = "{aws_access_token}"',
-        f'aws_secret_key = "{aws_secret_token}"',
-        f'region = "{aws_region}"',
-        f'account_id = "{account_id}"',
-        f'owner = "{owner}"',
-        f'devops_repo_url = "{devops_repo_url}"',
-        f'backend_repo_url = "{backend_repo_url}"',
-        f'frontend_repo_url = "{frontend_repo_url}"',
-        f'git_username = "{git_username}"',
-        f'git_pat = "{git_pat}"',
-    ]
-    if aws_session_token: lines.append(f'aws_session_token = "{aws_session_token}"')
-    if ec2_dns: lines.append(f'ec2_dns = "{ec2_dns}"')
-    return "\n".join(lines) + "\n"
+    return (
+        f'aws_access_key = "{aws_access_token}"\n'
+        f'aws_secret_key = "{aws_secret_token}"\n'
+        f'region = "{aws_region}"\n'
+        f'account_id = "{account_id}"\n'
+        f'owner = "{owner}"\n'
+        f'devops_repo_url = "{devops_repo_url}"\n'
+        f'backend_repo_url = "{backend_repo_url}"\n'
+        f'frontend_repo_url = "{frontend_repo_url}"\n'
+        f'git_username = "{git_username}"\n'
+        f'git_pat = "{git_pat}"\n'
+        + (f'aws_session_token = "{aws_session_token}"\n' if aws_session_token else "")
+        + (f'ec2_dns = "{ec2_dns}"\n' if ec2_dns else "")
+    )
 
 
 def _write_credentials(p: RepoPaths) -> None:
     p.dev_credentials_tfvars.parent.mkdir(parents=True, exist_ok=True)
-    p.dev_credentials_tfvars.write_text(_credentials_tfvars_content(), encoding="utf-8", newline="\n")
+    blob = _credentials_tfvars_blob
+    if blob is None: blob = _credentials_tfvars_content().encode("utf-8")
+    p.dev_credentials_tfvars.write_bytes(blob)
     print(f"Wrote: {p.dev_credentials_tfvars}")
 
 
@@ -326,87 +346,215 @@ def _resolve_bash_path() -> Path:
     raise FileNotFoundError(f"Git Bash not found at {DEFAULT_GIT_BASH}")
 
 
+# Built on first use after _apply_env; treat as read-only and copy before adding keys
+_subprocess_env_cache: dict[str, str] | None = None
+
+
+def _invalidate_subprocess_env() -> None:
+    global _subprocess_env_cache
+    _subprocess_env_cache = None
+
+
 def _clean_env_for_subprocess() -> dict[str, str]:
+    global _subprocess_env_cache
+    if _subprocess_env_cache is None:
+        _subprocess_env_cache = _build_subprocess_env()
+    return _subprocess_env_cache
+
+
+def _build_subprocess_env() -> dict[str, str]:
     env = dict(os.environ)
     for k in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN", "AWS_PROFILE", "AWS_DEFAULT_PROFILE"):
         env.pop(k, None)
     env["TF_IN_AUTOMATION"] = "1"
-    # Pass vars for TF
-    env["TF_VAR_devops_repo_url"] = devops_repo_url
-    env["TF_VAR_backend_repo_url"] = backend_repo_url
-    env["TF_VAR_frontend_repo_url"] = frontend_repo_url
-    env["TF_VAR_git_username"] = git_username
-    env["TF_VAR_git_pat"] = git_pat
-    if ec2_dns:
-        env["TF_VAR_ec2_dns"] = ec2_dns
+    # Terraform's default of 10 concurrent operations leaves most API latency un-overlapped
+    parallelism = f"-parallelism={max(10, 3 * (os.cpu_count() or 4))}"
+    for cmd in ("plan", "apply", "destroy"):
+        env.setdefault(f"TF_CLI_ARGS_{cmd}", parallelism)
+    # Pass vars for TF and the SMEE relay; empty ones are removed so a stale
+    # value from the parent shell can't leak through
+    tf_vars = {
+        "devops_repo_url": devops_repo_url,
+        "backend_repo_url": backend_repo_url,
+        "frontend_repo_url": frontend_repo_url,
+        "git_username": git_username,
+        "git_pat": git_pat,
+        "ec2_dns": ec2_dns,
+    }
+    for name, value in tf_vars.items():
+        if value: env[f"TF_VAR_{name}"] = value
+        else: env.pop(f"TF_VAR_{name}", None)
+    smee_vars = {
+        "SMEE_URL": smee_url,
+        "SMEE_BACKEND": smee_backend,
+        "SMEE_FRONTEND": smee_frontend,
+        "SMEE_DEVOPS": smee_devops,
+        "SMEE_TARGET": smee_target,
+    }
+    for name, value in smee_vars.items():
+        if value: env[name] = value
+        else: env.pop(name, None)
     # Pass vars for AWS CLI
     env["AWS_ACCESS_KEY_ID"] = aws_access_token
-    env["SMEE_URL"] = smee_url
-    env["SMEE_BACKEND"] = smee_backend
-    env["SMEE_FRONTEND"] = smee_frontend
-    env["SMEE_DEVOPS"] = smee_devops
-    env["SMEE_TARGET"] = smee_target
     env["AWS_SECRET_ACCESS_KEY"] = aws_secret_token
     if aws_session_token: env["AWS_SESSION_TOKEN"] = aws_session_token
     env["AWS_DEFAULT_REGION"] = aws_region
     return env
 
 
+# Emitted by the EC2 bootstrap when TF_VAR_echo_jenkins_password is set; the
+# value is _JENKINS_NO_PASSWORD when the setup wizard is disabled
+_JENKINS_PW_RE = re.compile(rb"__JENKINS_PW__:([0-9A-Za-z_]+)")
+_JENKINS_NO_PASSWORD = "__NO_PASSWORD__"
+
+
+def _normalize_line_endings(script_path: Path) -> None:
+    # Windows checkouts may have CRLF endings, which bash chokes on; LF files are left untouched
+    data = script_path.read_bytes()
+    if b"\r\n" in data:
+        script_path.write_bytes(data.replace(b"\r\n", b"\n"))
+
+
 def _run_bash_script(bash_path: Path, script_name: str, cwd: Path, auto_confirm: bool,
-                     extra_env: dict[str, str] | None = None) -> None:
+                     extra_env: dict[str, str] | None = None,
+                     capture_jenkins_password: bool = False) -> str | None:
+    """
+    Run a script from cwd under Git Bash; raises RuntimeError on a non-zero exit.
+    With capture_jenkins_password, stdout is teed to the console and the
+    Jenkins initial admin password (or _JENKINS_NO_PASSWORD) is returned if
+    the script printed one; None means nothing was captured (or the console
+    has no byte stream to tee to, e.g. under IDLE).
+    """
+    import subprocess
     script_path = cwd / script_name
     if not script_path.exists(): raise FileNotFoundError(f"Script not found: {script_path}")
 
-    cmd = [str(bash_path), "-lc", f"sed -i 's/\\r$//' {script_name}; bash {script_name}"]
-    stdin_payload = ("yes\n" * 200) if auto_confirm else None
+    _normalize_line_endings(script_path)
+
+    # auto_confirm: `yes yes` answers every prompt with the literal "yes" Terraform wants; stdin is otherwise inherited
+    run = f"yes yes | bash {script_name}" if auto_confirm else f"bash {script_name}"
+    cmd = [str(bash_path), "-lc", run]
+    stdin = subprocess.DEVNULL if auto_confirm else None
 
     print(f"\nExecuting in: {cwd}")
     env = _clean_env_for_subprocess()
-    if extra_env: env.update(extra_env)
+    if extra_env: env = {**env, **extra_env}
 
-    result = subprocess.run(cmd, cwd=str(cwd), text=True, env=env, input=stdin_payload)
-    if result.returncode != 0:
-        raise RuntimeError(f"{script_name} failed with exit code {result.returncode}")
+    out = getattr(sys.stdout, "buffer", None) if capture_jenkins_password else None
+    if out is None:
+        result = subprocess.run(cmd, cwd=str(cwd), text=True, env=env, stdin=stdin)
+        if result.returncode != 0:
+            raise RuntimeError(f"{script_name} failed with exit code {result.returncode}")
+        return None
+
+    # Tee raw chunks as they arrive so prompts without a trailing newline show up
+    # before the user answers them; the marker is matched on complete lines only
+    jenkins_pw: str | None = None
+    pending = b""
+    sys.stdout.flush()
+    with subprocess.Popen(cmd, cwd=str(cwd), env=env, stdin=stdin, stdout=subprocess.PIPE) as proc:
+        while chunk := proc.stdout.read1(4096):
+            out.write(chunk)
+            out.flush()
+            lines, _, pending = (pending + chunk).rpartition(b"\n")
+            for m in _JENKINS_PW_RE.finditer(lines): jenkins_pw = m.group(1).decode("ascii")
+            pending = pending[-256:]
+    for m in _JENKINS_PW_RE.finditer(pending): jenkins_pw = m.group(1).decode("ascii")
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script_name} failed with exit code {proc.returncode}")
+    return jenkins_pw
 
 
 # ---------------------------------------------------------------------
 # Preflight
 # ---------------------------------------------------------------------
-def _preflight_aws_identity(bash_path: Path, cwd: Path) -> None:
-    cmd = [str(bash_path), "-lc", "aws sts get-caller-identity || echo 'AWS CLI check failed'"]
-    env = _clean_env_for_subprocess()
-    subprocess.run(cmd, cwd=str(cwd), text=True, env=env, check=False)
+# Output of the last successful `aws sts get-caller-identity`; reset by _apply_env
+_aws_identity_cache: str | None = None
+
+
+def _preflight_aws_identity(bash_path: Path, cwd: Path) -> str:
+    """Return the caller identity, or the failure text; the caller prints it so output order stays fixed."""
+    global _aws_identity_cache
+    import subprocess
+    if _aws_identity_cache is None:
+        cmd = [str(bash_path), "-lc", "aws sts get-caller-identity"]
+        env = _clean_env_for_subprocess()
+        result = subprocess.run(cmd, cwd=str(cwd), capture_output=True, text=True, env=env, check=False)
+        if result.returncode != 0:
+            return "\n".join(filter(None, ("AWS CLI check failed", result.stderr.strip())))
+        _aws_identity_cache = result.stdout.strip()
+    return _aws_identity_cache
 
 
 # ---------------------------------------------------------------------
 # EC2 Management Functions
 # ---------------------------------------------------------------------
-def _get_instance_id() -> str | None:
-    """Get the instance ID for the current owner's EC2 instance."""
-    cmd = [
-        "aws", "ec2", "describe-instances",
-        "--filters", f"Name=tag:Owner,Values={owner}",
-        "--query", "Reservations[0].Instances[0].InstanceId",
-        "--output", "text"
-    ]
+class _AwsCliEc2:
+    """
+    Stand-in for the boto3 EC2 client that shells out to the aws CLI.
+    Covers only the calls used below; the CLI's JSON has the same shape as boto3's responses.
+    """
 
-    env = _clean_env_for_subprocess()
+    def _call(self, op: str, *args: str) -> dict[str, Any]:
+        import json
+        import subprocess
+        cmd = ["aws", "ec2", op, *args, "--output", "json"]
+        result = subprocess.run(cmd, capture_output=True, text=True, env=_clean_env_for_subprocess(), check=False)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"aws ec2 {op} failed with exit code {result.returncode}")
+        return json.loads(result.stdout) if result.stdout.strip() else {}
 
-    try:
-        if not shutil.which("aws"):
-            print("⚠ 'aws' command not found on PATH.")
-            return None
+    def describe_instances(self, InstanceIds: list[str] | None = None, Filters: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+        args: list[str] = []
+        if InstanceIds: args += ["--instance-ids", *InstanceIds]
+        if Filters: args += ["--filters", *(f"Name={f['Name']},Values={','.join(f['Values'])}" for f in Filters)]
+        return self._call("describe-instances", *args)
+
+    def reboot_instances(self, InstanceIds: list[str]) -> dict[str, Any]:
+        return self._call("reboot-instances", "--instance-ids", *InstanceIds)
+
+    def stop_instances(self, InstanceIds: list[str]) -> dict[str, Any]:
+        return self._call("stop-instances", "--instance-ids", *InstanceIds)
 
-        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    def start_instances(self, InstanceIds: list[str]) -> dict[str, Any]:
+        return self._call("start-instances", "--instance-ids", *InstanceIds)
 
-        if result.returncode != 0 or not result.stdout.strip():
-            return None
 
-        instance_id = result.stdout.strip()
-        if instance_id == "None":
-            return None
+# EC2 client (boto3, else the aws CLI) for the loaded credentials; reset by _apply_env
+_ec2_client_cache: Any = None
+
+
+def _ec2_client() -> Any:
+    """Return a cached EC2 client: boto3 if installed, else the aws CLI, else None."""
+    global _ec2_client_cache
+    if _ec2_client_cache is None:
+        try:
+            import boto3
+        except ImportError:
+            # AWS CLI v2 bundles its own Python, so boto3 is often missing from this interpreter
+            if not shutil.which("aws"):
+                print("⚠ Neither boto3 nor the 'aws' command is available (pip install boto3).")
+                return None
+            _ec2_client_cache = _AwsCliEc2()
+            return _ec2_client_cache
+        _ec2_client_cache = boto3.client(
+            "ec2",
+            region_name=aws_region,
+            aws_access_key_id=aws_access_token,
+            aws_secret_access_key=aws_secret_token,
+            aws_session_token=aws_session_token or None,
+        )
+    return _ec2_client_cache
+
+
+def _get_instance_id() -> str | None:
+    """Get the instance ID for the current owner's EC2 instance."""
+    ec2 = _ec2_client()
+    if ec2 is None: return None
 
-        return instance_id
+    try:
+        resp = ec2.describe_instances(Filters=[{"Name": "tag:Owner", "Values": [owner]}])
+        return resp["Reservations"][0]["Instances"][0]["InstanceId"]
     except Exception:
         return None
 
@@ -416,57 +564,64 @@ def _get_connection_info() -> tuple[str | None, str | None]:
     Fetch EC2 instance IP and DNS.
     Returns: (public_ip, public_dns)
     """
-    cmd_ip = [
-        "aws", "ec2", "describe-instances",
-        "--filters", f"Name=tag:Owner,Values={owner}", "Name=instance-state-name,Values=running",
-        "--query", "Reservations[0].Instances[0].PublicIpAddress",
-        "--output", "text"
-    ]
+    ec2 = _ec2_client()
+    if ec2 is None: return None, None
 
-    cmd_dns = [
-        "aws", "ec2", "describe-instances",
-        "--filters", f"Name=tag:Owner,Values={owner}", "Name=instance-state-name,Values=running",
-        "--query", "Reservations[0].Instances[0].PublicDnsName",
-        "--output", "text"
-    ]
+    try:
+        resp = ec2.describe_instances(Filters=[
+            {"Name": "tag:Owner", "Values": [owner]},
+            {"Name": "instance-state-name", "Values": ["running"]},
+        ])
+        if not resp["Reservations"]: return None, None
 
-    env = _clean_env_for_subprocess()
+        instance = resp["Reservations"][0]["Instances"][0]
+        return instance.get("PublicIpAddress") or None, instance.get("PublicDnsName") or None
 
-    try:
-        if not shutil.which("aws"):
-            print("⚠ 'aws' command not found on PATH. Cannot fetch connection info.")
-            return None, None
+    except Exception as e:
+        print(f"⚠ Error fetching connection info: {e}")
+        return None, None
 
-        ip_result = subprocess.run(cmd_ip, capture_output=True, text=True, env=env)
-        dns_result = subprocess.run(cmd_dns, capture_output=True, text=True, env=env)
+def _ssh_opts() -> list[str]:
+    """
+    Connection-sharing options for the driver's own ssh calls (not on Windows OpenSSH).
+    Kept out of the printed hints: a user's tunnel would otherwise become the shared
+    session and hold port 8080 for ControlPersist after they exit.
+    """
+    if os.name == "nt": return []
+    return ["-o", "ControlMaster=auto", "-o", "ControlPersist=60s", "-o", "ControlPath=~/.ssh/cm-%C"]
 
-        ip = ip_result.stdout.strip() if ip_result.returncode == 0 else None
-        dns = dns_result.stdout.strip() if dns_result.returncode == 0 else None
 
-        if ip == "None": ip = None
-        if dns == "None": dns = None
+def _print_jenkins_password_banner(password: str) -> None:
+    print("\n" + "=" * 70)
+    print("        JENKINS INITIAL ADMIN PASSWORD")
+    print("=" * 70)
+    print(password)
+    print("=" * 70)
+    print("Use this password on the Jenkins Unlock screen.")
+
 
-        return ip, dns
+def _print_jenkins_wizard_disabled() -> None:
+    print("✓ Jenkins setup wizard is disabled (no initial admin password).")
+    print("  Admin user is expected to be provisioned via Groovy / JCasC.")
 
-    except Exception as e:
-        print(f"⚠ Error fetching connection info: {e}")
-        return None, None
 
 def _print_jenkins_initial_admin_password(endpoint: str) -> None:
     """
     Fetch and print Jenkins initial admin password (if setup wizard is enabled).
     This works only on a fresh Jenkins with the unlock screen.
     """
+    import subprocess
     print("\n[Jenkins] Checking for initial admin password...")
 
     ssh_cmd = [
         "ssh",
+        *_ssh_opts(),
         "-o", "StrictHostKeyChecking=no",
         "-i", STACK_KEY_PATH,
         f"ubuntu@{endpoint}",
         "sudo test -f /var/lib/jenkins/secrets/initialAdminPassword "
         "&& sudo cat /var/lib/jenkins/secrets/initialAdminPassword "
-        "|| echo '__NO_PASSWORD__'"
+        f"|| echo '{_JENKINS_NO_PASSWORD}'"
     ]
 
     try:
@@ -483,16 +638,10 @@ def _print_jenkins_initial_admin_password(endpoint: str) -> None:
 
         output = result.stdout.strip()
 
-        if output == "__NO_PASSWORD__":
-            print("✓ Jenkins setup wizard is disabled (no initial admin password).")
-            print("  Admin user is expected to be provisioned via Groovy / JCasC.")
+        if output == _JENKINS_NO_PASSWORD:
+            _print_jenkins_wizard_disabled()
         elif output:
-            print("\n" + "=" * 70)
-            print("        JENKINS INITIAL ADMIN PASSWORD")
-            print("=" * 70)
-            print(output)
-            print("=" * 70)
-            print("Use this password on the Jenkins Unlock screen.")
+            _print_jenkins_password_banner(output)
         else:
             print("⚠ Jenkins password file empty or unreadable.")
 
@@ -500,15 +649,15 @@ def _print_jenkins_initial_admin_password(endpoint: str) -> None:
         print("⚠ Timeout while trying to fetch Jenkins password.")
 
 
-def _print_connection_info() -> None:
-    """Print connection information after deployment."""
+def _print_connection_info() -> tuple[str | None, str | None]:
+    """Print connection information after deployment and return (public_ip, public_dns)."""
     print("\n[Summary] Fetching instance details from AWS...")
 
     ip, dns = _get_connection_info()
 
     if not ip and not dns:
         print("⚠ Could not fetch IP/DNS. Is the instance running?")
-        return
+        return ip, dns
 
     print("\n" + "=" * 70)
     print("                 DEPLOYMENT COMPLETE")
@@ -519,7 +668,7 @@ def _print_connection_info() -> None:
     if dns:
         print(f"Public DNS:       {dns}")
 
-    print("-" * 70)
+    print(_SEP)
 
     # Use DNS if available, otherwise IP
     endpoint = dns if dns else ip
@@ -530,10 +679,31 @@ def _print_connection_info() -> None:
         print(f"  ssh -i {STACK_KEY_PATH} -L 8080:localhost:8080 ubuntu@{endpoint}")
         print("  Then open: http://localhost:8080")
         print(f"API URL:          http://{endpoint}/api/")
-        print("-" * 70)
+        print(_SEP)
         print("SSH Connection Command:")
         print(f'ssh -i {STACK_KEY_PATH} ubuntu@{endpoint}')
-        print("-" * 70 + "\n")
+        print(_SEP + "\n")
+
+    return ip, dns
+
+
+def _wait_for_instance_state(ec2: Any, instance_id: str, state: str, timeout: float = 600.0) -> None:
+    """
+    Poll until the instance reaches `state`, backing off 2s -> 4s -> ... -> 30s.
+    Most transitions finish early, so this beats a fixed 15s poll without hammering the API.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 2.0
+    while True:
+        resp = ec2.describe_instances(InstanceIds=[instance_id])
+        current = resp["Reservations"][0]["Instances"][0]["State"]["Name"]
+        if current == state: return
+        if current == "terminated":
+            raise RuntimeError(f"{instance_id} was terminated while waiting for '{state}'")
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{instance_id} still '{current}' after {int(timeout)}s (waiting for '{state}')")
+        time.sleep(delay)
+        delay = min(30.0, delay * 2)
 
 
 def _restart_ec2() -> None:
@@ -550,20 +720,13 @@ def _restart_ec2() -> None:
         print("Restart cancelled.")
         return
 
-    cmd = ["aws", "ec2", "reboot-instances", "--instance-ids", instance_id]
-    env = _clean_env_for_subprocess()
-
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-
-        if result.returncode == 0:
-            print(f"✓ Instance {instance_id} restart initiated successfully")
-            print("Note: It may take 1-2 minutes for the instance to restart")
-            print("      and services to come back online.")
-        else:
-            print(f"✗ Failed to restart instance: {result.stderr}")
+        _ec2_client().reboot_instances(InstanceIds=[instance_id])
+        print(f"✓ Instance {instance_id} restart initiated successfully")
+        print("Note: It may take 1-2 minutes for the instance to restart")
+        print("      and services to come back online.")
     except Exception as e:
-        print(f"✗ Error restarting instance: {e}")
+        print(f"✗ Failed to restart instance: {e}")
 
 def _stop_start_ec2() -> None:
     """
@@ -583,42 +746,42 @@ def _stop_start_ec2() -> None:
     print("=" * 70)
     print("WARNING: This will likely assign a NEW public IP when the instance starts.")
     print("         If you rely on the old IP/DNS, it will break.")
-    print("-" * 70)
+    print(_SEP)
 
     if not _prompt_yes_no("Are you sure you want to STOP and START the instance?", default_yes=False):
         print("Stop/Start cancelled.")
         return
 
-    env = _clean_env_for_subprocess()
+    ec2 = _ec2_client()
 
     # Stop
     print(f"\nStopping EC2 instance: {instance_id}")
-    stop_cmd = ["aws", "ec2", "stop-instances", "--instance-ids", instance_id]
-    stop_res = subprocess.run(stop_cmd, capture_output=True, text=True, env=env)
-    if stop_res.returncode != 0:
-        print(f"✗ Failed to stop instance: {stop_res.stderr}")
+    try:
+        ec2.stop_instances(InstanceIds=[instance_id])
+    except Exception as e:
+        print(f"✗ Failed to stop instance: {e}")
         return
 
     print("✓ Stop initiated. Waiting until instance is stopped...")
-    wait_stop_cmd = ["aws", "ec2", "wait", "instance-stopped", "--instance-ids", instance_id]
-    wait_stop_res = subprocess.run(wait_stop_cmd, capture_output=True, text=True, env=env)
-    if wait_stop_res.returncode != 0:
-        print(f"✗ Error while waiting for stop: {wait_stop_res.stderr}")
+    try:
+        _wait_for_instance_state(ec2, instance_id, "stopped")
+    except Exception as e:
+        print(f"✗ Error while waiting for stop: {e}")
         return
 
     # Start
     print(f"\nStarting EC2 instance: {instance_id}")
-    start_cmd = ["aws", "ec2", "start-instances", "--instance-ids", instance_id]
-    start_res = subprocess.run(start_cmd, capture_output=True, text=True, env=env)
-    if start_res.returncode != 0:
-        print(f"✗ Failed to start instance: {start_res.stderr}")
+    try:
+        ec2.start_instances(InstanceIds=[instance_id])
+    except Exception as e:
+        print(f"✗ Failed to start instance: {e}")
         return
 
     print("✓ Start initiated. Waiting until instance is running...")
-    wait_run_cmd = ["aws", "ec2", "wait", "instance-running", "--instance-ids", instance_id]
-    wait_run_res = subprocess.run(wait_run_cmd, capture_output=True, text=True, env=env)
-    if wait_run_res.returncode != 0:
-        print(f"✗ Error while waiting for running: {wait_run_res.stderr}")
+    try:
+        _wait_for_instance_state(ec2, instance_id, "running")
+    except Exception as e:
+        print(f"✗ Error while waiting for running: {e}")
         return
 
     print("\n✓ Instance is running again.")
@@ -646,48 +809,59 @@ def _show_connection_info() -> None:
     if dns:
         print(f"Public DNS:       {dns}")
 
-    print("-" * 70)
+    print(_SEP)
 
     if endpoint:
         print(f"Frontend URL:     http://{endpoint}/")
         print(f"API URL:          http://{endpoint}/api/")
-        print("-" * 70)
+        print(_SEP)
 
         print("Jenkins access (via SSH tunnel):")
         print(f"  ssh -i {STACK_KEY_PATH} -L 8080:localhost:8080 ubuntu@{endpoint}")
         print("  Then open: http://localhost:8080")
-        print("-" * 70)
+        print(_SEP)
 
         print("Direct SSH connection:")
         print(f"  ssh -i {STACK_KEY_PATH} ubuntu@{endpoint}")
 
-    print("-" * 70 + "\n")
-3
+    print(_SEP + "\n")
 
 
 # ---------------------------------------------------------------------
 # Flows
 # ---------------------------------------------------------------------
+def _preflight_and_write_credentials(p: RepoPaths, bash_path: Path) -> None:
+    # The STS round-trip is network-bound and independent of the local tfvars write
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        preflight = ex.submit(_preflight_aws_identity, bash_path, p.infra_dir)
+        _write_credentials(p)
+    print(preflight.result())
+
+
 def _provision(p: RepoPaths, bash_path: Path) -> None:
     print("\n[Provision] Writing tfvars and running setup.sh...")
-    _preflight_aws_identity(bash_path, p.infra_dir)
-    _write_credentials(p)
+    _preflight_and_write_credentials(p, bash_path)
     print("Auto-start service (systemd) is ENABLED by default.")
-    extra_env = {"ENABLE_AUTOSTART": "1"}
-    _run_bash_script(bash_path, SETUP_SH, p.infra_dir, auto_confirm=False, extra_env=extra_env)
-    _print_connection_info()
-    ip, dns = _get_connection_info()
-    endpoint = dns if dns else ip
-    if endpoint:
-        _print_jenkins_initial_admin_password(endpoint)
+    extra_env = {"ENABLE_AUTOSTART": "1", "TF_VAR_echo_jenkins_password": "true"}
+    jenkins_pw = _run_bash_script(bash_path, SETUP_SH, p.infra_dir, auto_confirm=False,
+                                  extra_env=extra_env, capture_jenkins_password=True)
+    ip, dns = _print_connection_info()
+    if jenkins_pw == _JENKINS_NO_PASSWORD:
+        _print_jenkins_wizard_disabled()
+    elif jenkins_pw:
+        _print_jenkins_password_banner(jenkins_pw)
+    else:
+        # Bootstrap output wasn't captured (e.g. provisioner didn't re-run); ask the instance directly
+        endpoint = dns if dns else ip
+        if endpoint:
+            _print_jenkins_initial_admin_password(endpoint)
     print("[Provision] Completed successfully.")
 
 
 
 def _destroy(p: RepoPaths, bash_path: Path) -> None:
     print("\n[Destroy] Writing tfvars and running destroy.sh...")
-    _preflight_aws_identity(bash_path, p.infra_dir)
-    _write_credentials(p)
+    _preflight_and_write_credentials(p, bash_path)
     enable_autostart = os.environ.get("ENABLE_AUTOSTART", "0").strip()
     extra_env = {"ENABLE_AUTOSTART": enable_autostart}
     _run_bash_script(bash_path, DESTROY_SH, p.infra_dir, auto_confirm=True, extra_env=extra_env)
@@ -702,28 +876,33 @@ def main() -> int:
     script_dir = Path(__file__).resolve().parent
     env_path = script_dir / ENV_FILE_NAME
 
-    try:
-        env_data = _load_env_file(env_path)
-        _apply_env(env_data)
-        _print_loaded_env(env_path)
-    except Exception as e:
-        print(f"ERROR loading .env: {e}")
-        return 1
+    # The repo walk and bash lookup are disk-bound and independent of .env; overlap them with it.
+    # Leaving the block joins the pool, so a bad .env still waits for the walk (accepted: it is short)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        paths_future = ex.submit(lambda: _build_repo_paths(_find_devops_repo_root_from_script_location(script_dir)))
+        bash_future = ex.submit(_resolve_bash_path)
 
-    try:
-        devops_root = _find_devops_repo_root_from_script_location(script_dir)
-        paths = _build_repo_paths(devops_root)
-        _print_detected_paths(paths)
-    except Exception as e:
-        print(f"ERROR locating repo/infra: {e}")
-        return 1
+        try:
+            env_data = _load_env_file(env_path)
+            _apply_env(env_data)
+            _print_loaded_env(env_path)
+        except Exception as e:
+            print(f"ERROR loading .env: {e}")
+            return 1
 
-    try:
-        bash_path = _resolve_bash_path()
-        print(f"\nUsing Git Bash: {bash_path}")
-    except Exception as e:
-        print(f"ERROR locating Git Bash: {e}")
-        return 1
+        try:
+            paths = paths_future.result()
+            _print_detected_paths(paths)
+        except Exception as e:
+            print(f"ERROR locating repo/infra: {e}")
+            return 1
+
+        try:
+            bash_path = bash_future.result()
+            print(f"\nUsing Git Bash: {bash_path}")
+        except Exception as e:
+            print(f"ERROR locating Git Bash: {e}")
+            return 1
 
     while True:
         print("\nMenu")